@@ -2,14 +2,26 @@
 from __future__ import annotations
 
 import os
+import sys
+import queue
+import atexit
+import contextlib
+import asyncio
+import logging
+import logging.handlers
 import inspect
 import json
 import time
 import hashlib
+import threading
+import functools
+import types
 from pathlib import Path
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, Callable, List, Mapping, NamedTuple
 
-from fastapi import FastAPI, HTTPException, Request
+import httpx
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
@@ -22,6 +34,18 @@ BASE_DIR = Path(__file__).resolve().parent
 ENV_PATH = BASE_DIR / ".env"
 load_dotenv(dotenv_path=ENV_PATH)
 
+# -----------------------------
+# Logging: handlers write on a background thread so request paths never block on stderr
+# -----------------------------
+logger = logging.getLogger("app")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 # --- TLS helper: auto-inject certifi CA bundle so HTTPS works in Python on Windows ---
 # --- TLS helper: prefer Windows trust store; fallback to certifi bundle ---
 try:
@@ -29,17 +53,30 @@ try:
     import truststore  # type: ignore
     truststore.inject_into_ssl()
     truststore.inject_into_urllib3()
-    print("[TLS] Using Windows trust store via truststore")
+    logger.info("[TLS] Using Windows trust store via truststore")
 except Exception as e:
-    print(f"[TLS] truststore unavailable, falling back to certifi: {e}")
+    logger.warning(f"[TLS] truststore unavailable, falling back to certifi: {e}")
     try:
         import certifi  # type: ignore
         ca_path = certifi.where()
         os.environ.setdefault("SSL_CERT_FILE", ca_path)
         os.environ.setdefault("REQUESTS_CA_BUNDLE", ca_path)
-        print(f"[TLS] Using CA bundle: {ca_path}")
+        logger.info(f"[TLS] Using CA bundle: {ca_path}")
     except Exception as ee:
-        print(f"[TLS] Warning: could not set certifi CA bundle automatically: {ee}")
+        logger.warning(f"[TLS] Warning: could not set certifi CA bundle automatically: {ee}")
+
+# -----------------------------
+# JSON codec: orjson (C extension) when available, stdlib otherwise
+# -----------------------------
+try:
+    import orjson  # type: ignore
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
 # -----------------------------
 # OpenFeature (flagd mode)
@@ -47,26 +84,59 @@ except Exception as e:
 from openfeature import api as openfeature
 from openfeature.evaluation_context import EvaluationContext
 from openfeature.contrib.provider.flagd import FlagdProvider
+from openfeature.contrib.provider.flagd.config import DEFAULT_DEADLINE as _FLAGD_DEFAULT_DEADLINE_MS
 
 # -----------------------------
 # Flagsmith server SDK (online)
 # -----------------------------
 from flagsmith import Flagsmith  # pip install flagsmith
 
+# -----------------------------
+# LaunchDarkly server SDK (Context imported once; clients built in _init_*)
+# -----------------------------
+try:
+    from ldclient import Context as LDContext  # type: ignore
+except Exception:
+    LDContext = None
+
+# -----------------------------
+# File-change notifications (optional; falls back to stat() polling)
+# -----------------------------
+try:
+    from watchdog.observers import Observer  # type: ignore
+    from watchdog.events import FileSystemEventHandler  # type: ignore
+except Exception:
+    Observer = None
+    FileSystemEventHandler = object
+
+# -----------------------------
+# BLAKE3 (optional; diag file hash only)
+# -----------------------------
+try:
+    import blake3  # type: ignore
+except ImportError:
+    blake3 = None
+
 # -----------------------------
 # Config
 # -----------------------------
 FLAGD_HOST = os.getenv("FLAGD_HOST", "localhost")
 FLAGD_PORT = int(os.getenv("FLAGD_PORT", "8013"))
 FLAGD_TLS = os.getenv("FLAGD_TLS", "false").lower() in {"1", "true", "yes"}
+# gRPC keepalive is left to FlagdProvider's own FLAGD_KEEP_ALIVE_TIME_MS (default 0 = disabled)
+# Same variable FlagdProvider reads itself; None -> the provider's DEFAULT_DEADLINE
+FLAGD_DEADLINE_MS = int(os.getenv("FLAGD_DEADLINE_MS", "0")) or None
 
 FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:3000").rstrip("/")
 
 BACKEND_PROVIDER = os.getenv("BACKEND_PROVIDER", "flagd").lower().strip()
+_DEFAULT_PROVIDER = sys.intern(BACKEND_PROVIDER or "flagd")  # refreshed in startup_init
 
 # LaunchDarkly (file/eval offline)
 LD_SDK_KEY = os.getenv("LD_SDK_KEY", "dummy-offline-sdk-key")
 LD_FLAGS_FILE = os.getenv("LD_FLAGS_FILE", "./launchdarkly/ld-flags.json")
+# File data source loads from local disk (typically <50ms), so startup need not wait long
+LD_FILE_INIT_TIMEOUT_SECONDS = float(os.getenv("LD_FILE_INIT_TIMEOUT_SECONDS", "0.5"))
 
 # LaunchDarkly ONLINE (server SDK)
 LD_ONLINE_SDK_KEY = os.getenv("LD_ONLINE_SDK_KEY")  # real server SDK key (keep secret)
@@ -75,6 +145,9 @@ LD_ONLINE_STREAM_URI = os.getenv("LD_ONLINE_STREAM_URI")  # optional
 LD_ONLINE_EVENTS_URI = os.getenv("LD_ONLINE_EVENTS_URI")  # optional
 LD_ONLINE_INIT_TIMEOUT_SECONDS = float(os.getenv("LD_ONLINE_INIT_TIMEOUT_SECONDS", "3"))
 LD_ONLINE_SEND_EVENTS = os.getenv("LD_ONLINE_SEND_EVENTS", "false").lower() in {"1", "true", "yes"}
+# Timeouts for the LD SDK's pooled HTTP client (urllib3 PoolManager reused across requests)
+LD_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LD_HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+LD_HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("LD_HTTP_READ_TIMEOUT_SECONDS", "30"))
 
 # GrowthBook (offline file)
 GROWTHBOOK_FEATURES_FILE = os.getenv("GROWTHBOOK_FEATURES_FILE", "growthbook/features.json")
@@ -82,12 +155,28 @@ GROWTHBOOK_FEATURES_FILE = os.getenv("GROWTHBOOK_FEATURES_FILE", "growthbook/fea
 # Flagsmith (offline file)
 FLAGSMITH_ENV_FILE = os.getenv("FLAGSMITH_ENV_FILE", "flagsmith/environment.json")
 
+# Burst writes to a watched flag file are coalesced into one reload after this delay
+FILE_RELOAD_DEBOUNCE_SECONDS = float(os.getenv("FILE_RELOAD_DEBOUNCE_SECONDS", "1"))
+# While the watcher runs, files are still stat()ed at most this often (for mounts without inotify)
+FILE_POLL_FALLBACK_SECONDS = float(os.getenv("FILE_POLL_FALLBACK_SECONDS", "30"))
+
+# Diag content hash: "blake3" (default, if installed) or "sha256" (e.g. for compliance environments)
+FILE_HASH_ALGO = "blake3" if os.getenv("FILE_HASH_ALGO", "blake3").lower().strip() == "blake3" and blake3 is not None else "sha256"
+
 # Flagsmith Online (server-side)
 FLAGSMITH_ENV_KEY = os.getenv("FLAGSMITH_ENV_KEY")  # SECRET: server env key (starts with "ser.")
 FLAGSMITH_API_URL = os.getenv("FLAGSMITH_API_URL")  # optional override (self-hosted or explicit cloud URL)
 FLAGSMITH_TLS_INSECURE = os.getenv("FLAGSMITH_TLS_INSECURE", "false").lower() in {"1", "true", "yes"}
 FLAGSMITH_REQUEST_TIMEOUT_SECONDS = float(os.getenv("FLAGSMITH_REQUEST_TIMEOUT_SECONDS", "3"))
 
+# In-process evaluation cache (short TTL; absorbs bursts of identical lookups)
+EVAL_CACHE_ENABLED = os.getenv("EVAL_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+EVAL_CACHE_TTL_MS = int(os.getenv("EVAL_CACHE_TTL_MS", "3000"))
+EVAL_CACHE_MAX_ITEMS = int(os.getenv("EVAL_CACHE_MAX_ITEMS", "50000"))
+# A size of 0 (or less) turns the caches off; TTLCache(maxsize=0) would reject every store
+EVAL_CACHE_ENABLED = EVAL_CACHE_ENABLED and EVAL_CACHE_MAX_ITEMS > 0
+FLAGS_RESPONSE_CACHE_TTL_MS = int(os.getenv("FLAGS_RESPONSE_CACHE_TTL_MS", "2000"))
+
 # Normalize file paths to absolute
 def _abs(p: str) -> Path:
     q = Path(p)
@@ -108,20 +197,67 @@ _ld_online_client = None   # LaunchDarkly client (online/server)
 
 _fs_online_client: Optional[Flagsmith] = None  # Flagsmith Online
 
-# Cached docs for GrowthBook/Flagsmith (offline)
-_gb_doc: Optional[Dict[str, Any]] = None
+# Online clients are created on first use (see _get_ld_online_client / _get_fs_online_client),
+# each under its own lock so a slow LD wait does not hold up Flagsmith
+_ld_online_init_lock = threading.Lock()
+_fs_online_init_lock = threading.Lock()
+_httpx: Optional[httpx.AsyncClient] = None     # shared async HTTP client (raw Flagsmith diag)
+
+# Cached docs for GrowthBook/Flagsmith (offline). Each reload builds a complete snapshot and
+# publishes it with one assignment; evaluators read the global once per call, so a concurrent
+# reload can never mix lookups from two documents.
+class _GbSnapshot(NamedTuple):
+    doc: Dict[str, Any]
+    # Context-independent flags pre-evaluated at reload (no rules)
+    static: Mapping[str, Any]
+    # Rules with conditions flattened to ((attr, str(value)), ...); force is _MISSING if absent
+    compiled_rules: Mapping[str, Tuple[Tuple[Tuple[Tuple[str, str], ...], Any], ...]]
+
+class _FsSnapshot(NamedTuple):
+    doc: Dict[str, Any]
+    feature_id_by_name: Mapping[str, int]
+    segment_by_id: Mapping[int, Dict[str, Any]]
+    # segment id -> predicate over the user id (the only attribute evaluations carry)
+    segment_matchers: Mapping[int, Callable[[str], bool]]
+    # First state per (feature id, segment id) and per feature id for the no-segment default
+    state_by_fid_seg: Mapping[Tuple[int, int], Dict[str, Any]]
+    default_state_by_fid: Mapping[int, Dict[str, Any]]
+    # feature id -> matchable segment ids in file order of their first state
+    seg_ids_by_fid: Mapping[int, Tuple[int, ...]]
+    # Flags with only a default state, pre-evaluated at reload
+    static_bool: Mapping[str, bool]
+    static_str: Mapping[str, str]
+
+_gb_snap: Optional[_GbSnapshot] = None
 _gb_mtime: Optional[float] = None
-_fs_doc: Optional[Dict[str, Any]] = None
+_fs_snap: Optional[_FsSnapshot] = None
 _fs_mtime: Optional[float] = None
-
-# For Flagsmith offline quick lookup (rebuilt when file reloads)
-_fs_feature_id_by_name: Dict[str, int] = {}
-_fs_segment_by_id: Dict[int, Dict[str, Any]] = {}
-_fs_states_by_fid: Dict[int, list] = {}
+_MISSING = object()
+
+# While the watchdog observer runs it reloads docs on change; otherwise evaluators stat() per call
+_file_observer = None
+_reload_lock = threading.Lock()  # serializes watcher and fallback reloads
+_reload_timers: Dict[str, threading.Timer] = {}
+_gb_checked_at = 0.0
+_fs_checked_at = 0.0
+
+# LD flags file hash memo for the diag route: path -> (mtime_ns, size, hex)
+_hash_cache: Dict[Path, Tuple[int, int, str]] = {}
+_hash_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+# (generation, provider, flag_key, user_id, kind, default) -> evaluated value
+# TTLCache also evicts least-recently-used entries once EVAL_CACHE_MAX_ITEMS is reached
+_eval_cache: TTLCache = TTLCache(maxsize=EVAL_CACHE_MAX_ITEMS, ttl=EVAL_CACHE_TTL_MS / 1000.0)
+_eval_cache_lock = threading.Lock()
+_eval_cache_gen = 0  # bumped on flag file reload; part of every key so old entries are never read
+# (generation, provider, userId) -> already-encoded /api/flags body (shares _eval_cache_lock)
+_flags_resp_cache: TTLCache = TTLCache(maxsize=EVAL_CACHE_MAX_ITEMS, ttl=FLAGS_RESPONSE_CACHE_TTL_MS / 1000.0)
 
 # -----------------------------
 # Helpers
 # -----------------------------
+# Contexts are immutable and a pure function of uid, so they are shared across requests
+@functools.lru_cache(maxsize=10_000)
 def build_of_context(user_id: Optional[str]) -> EvaluationContext:
     uid = user_id or "anonymous"
     return EvaluationContext(
@@ -129,15 +265,15 @@ def build_of_context(user_id: Optional[str]) -> EvaluationContext:
         attributes={"userId": uid},
     )
 
+@functools.lru_cache(maxsize=10_000)
 def build_ld_context(user_id: Optional[str]):
     uid = user_id or "anonymous"
-    from ldclient import Context  # type: ignore
-    if hasattr(Context, "builder"):
-        b = Context.builder(uid)
+    if hasattr(LDContext, "builder"):
+        b = LDContext.builder(uid)
         b.set("userId", uid)
         return b.build()
-    if hasattr(Context, "create"):
-        return Context.create(uid)
+    if hasattr(LDContext, "create"):
+        return LDContext.create(uid)
     raise RuntimeError("LaunchDarkly SDK Context API not found")
 
 def _load_json_with_cache(path: Path, last_mtime: Optional[float]) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
@@ -145,26 +281,91 @@ def _load_json_with_cache(path: Path, last_mtime: Optional[float]) -> Tuple[Opti
         raise RuntimeError(f"JSON file not found: {path}")
     mtime = path.stat().st_mtime
     if last_mtime is None or mtime > last_mtime:
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f), mtime
+        return _json_loads(path.read_bytes()), mtime
     return None, last_mtime
 
-def _sha256_file(path: Path) -> str:
-    h = hashlib.sha256()
+def _eval_cache_invalidate() -> None:
+    global _eval_cache_gen
+    with _eval_cache_lock:
+        _eval_cache_gen += 1
+        _flags_resp_cache.clear()
+
+def _eval_cache_peek(p: str, kind: str, flag_key: str, default: Any, user_id: str) -> Any:
+    """Cached value or _MISSING; lets async callers skip a thread hop on a hit."""
+    if not EVAL_CACHE_ENABLED:
+        return _MISSING
+    with _eval_cache_lock:
+        return _eval_cache.get((_eval_cache_gen, p, flag_key, user_id, kind, default), _MISSING)
+
+def _cached_eval(p: str, kind: str, flag_key: str, default: Any, user_id: str, compute) -> Any:
+    """kind is "b" (ff_bool) or "s" (ff_str)."""
+    if not EVAL_CACHE_ENABLED:
+        return compute()
+    # Generation is captured before compute(), so a value computed from a doc that reloads
+    # mid-evaluation is stored under the old generation and never served
+    key = (_eval_cache_gen, p, flag_key, user_id, kind, default)
+    with _eval_cache_lock:
+        hit = _eval_cache.get(key, _MISSING)
+    if hit is not _MISSING:
+        return hit
+    value = compute()
+    with _eval_cache_lock:
+        _eval_cache[key] = value
+    return value
+
+def _content_hash_file(path: Path) -> str:
+    # Only used to detect on-disk changes; BLAKE3 is several times faster than SHA-256
+    if FILE_HASH_ALGO == "blake3":
+        return blake3.blake3(path.read_bytes(), max_threads=blake3.blake3.AUTO).hexdigest()
     with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
+        # Python 3.11+: read+update loop runs in C with a large internal buffer
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
+        while chunk := f.read(1 << 20):
             h.update(chunk)
-    return h.hexdigest()
+        return h.hexdigest()
+
+def _content_hash_file_cached(path: Path, st: os.stat_result) -> str:
+    """Re-hash only when (mtime_ns, size) differs from the last seen stat."""
+    cached = _hash_cache.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        _hash_cache_stats["hits"] += 1
+        return cached[2]
+    _hash_cache_stats["misses"] += 1
+    digest = _content_hash_file(path)
+    _hash_cache[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
 
 # -----------------------------
 # Provider wiring
 # -----------------------------
 def _init_flagd_openfeature() -> None:
     global _of_client
-    provider = FlagdProvider(host=FLAGD_HOST, port=FLAGD_PORT, tls=FLAGD_TLS)
+    provider = FlagdProvider(
+        host=FLAGD_HOST,
+        port=FLAGD_PORT,
+        tls=FLAGD_TLS,
+        deadline_ms=FLAGD_DEADLINE_MS,
+    )
     openfeature.set_provider(provider)
     _of_client = openfeature.get_client("backend")
-    print(f"[Backend] Provider=flagd ({FLAGD_HOST}:{FLAGD_PORT}, tls={FLAGD_TLS})")
+    logger.info(f"[Backend] Provider=flagd ({FLAGD_HOST}:{FLAGD_PORT}, tls={FLAGD_TLS}, keepalive={provider.config.keep_alive_time}ms)")
+
+@functools.lru_cache(maxsize=1)
+def _ld_config_support() -> Tuple[Optional[str], bool]:
+    """
+    Inspect the installed SDK's Config once: (kwarg that takes a file data source, accepts http=).
+    Prefers the modern 'data_source', else the legacy names.
+    """
+    from ldclient.config import Config  # type: ignore
+    params = inspect.signature(Config.__init__).parameters
+    param = next((k for k in ("data_source", "update_processor_class", "update_processor") if k in params), None)
+    return param, "http" in params
+
+def _ld_http_config():
+    from ldclient.config import HTTPConfig  # type: ignore
+    return HTTPConfig(connect_timeout=LD_HTTP_CONNECT_TIMEOUT_SECONDS, read_timeout=LD_HTTP_READ_TIMEOUT_SECONDS)
 
 def _init_launchdarkly_file_mode() -> None:
     """
@@ -182,37 +383,26 @@ def _init_launchdarkly_file_mode() -> None:
     from ldclient.config import Config  # type: ignore
     from ldclient.integrations import Files  # type: ignore
 
-    file_data_source = Files.new_data_source(paths=[str(_ld_flags_path)], auto_update=True)
-
-    cfg_kwargs: Dict[str, Any] = {"send_events": False}
-    sig = inspect.signature(Config.__init__)
-    params = sig.parameters
-
-    # Prefer modern param 'data_source' if present
-    if "data_source" in params:
-        cfg_kwargs["data_source"] = file_data_source
-        param_used = "data_source"
-    # Else try legacy names
-    elif "update_processor_class" in params:
-        cfg_kwargs["update_processor_class"] = file_data_source
-        param_used = "update_processor_class"
-    elif "update_processor" in params:
-        cfg_kwargs["update_processor"] = file_data_source
-        param_used = "update_processor"
-    else:
+    param_used, accepts_http = _ld_config_support()
+    if param_used is None:
         raise RuntimeError("[LaunchDarkly] Unsupported SDK version: cannot attach file data source")
 
+    file_data_source = Files.new_data_source(paths=[str(_ld_flags_path)], auto_update=True)
+    cfg_kwargs: Dict[str, Any] = {"send_events": False, param_used: file_data_source}
+    if accepts_http:
+        cfg_kwargs["http"] = _ld_http_config()
+
     config = Config(LD_SDK_KEY, **cfg_kwargs)
     _ld_client = LDClient(config)
 
     # Initial wait (non-fatal on timeout)
     if hasattr(_ld_client, "wait_for_initialization"):
         try:
-            _ld_client.wait_for_initialization(2)
+            _ld_client.wait_for_initialization(LD_FILE_INIT_TIMEOUT_SECONDS)
         except Exception:
             pass
 
-    print(f"[Backend] Provider=launchdarkly (file={_ld_flags_path}, auto_update=True, via {param_used})")
+    logger.info(f"[Backend] Provider=launchdarkly (file={_ld_flags_path}, auto_update=True, via {param_used})")
 
 def _init_launchdarkly_online() -> None:
     """
@@ -226,9 +416,12 @@ def _init_launchdarkly_online() -> None:
     from ldclient import LDClient  # type: ignore
     from ldclient.config import Config  # type: ignore
 
+    _, accepts_http = _ld_config_support()
     cfg_kwargs: Dict[str, Any] = {
         "send_events": LD_ONLINE_SEND_EVENTS,
     }
+    if accepts_http:
+        cfg_kwargs["http"] = _ld_http_config()
     # Optional relay proxy URIs
     if LD_ONLINE_BASE_URI:
         cfg_kwargs["base_uri"] = LD_ONLINE_BASE_URI
@@ -238,14 +431,16 @@ def _init_launchdarkly_online() -> None:
         cfg_kwargs["events_uri"] = LD_ONLINE_EVENTS_URI
 
     config = Config(LD_ONLINE_SDK_KEY, **cfg_kwargs)
-    _ld_online_client = LDClient(config)
+    client = LDClient(config)
 
-    if hasattr(_ld_online_client, "wait_for_initialization"):
+    if hasattr(client, "wait_for_initialization"):
         try:
-            _ld_online_client.wait_for_initialization(LD_ONLINE_INIT_TIMEOUT_SECONDS)
+            client.wait_for_initialization(LD_ONLINE_INIT_TIMEOUT_SECONDS)
         except Exception as e:
-            print(f"[Backend] LaunchDarkly online init wait failed: {e}")
-    print("[Backend] Provider=launchdarkly-online (server SDK)")
+            logger.warning(f"[Backend] LaunchDarkly online init wait failed: {e}")
+    # Publish only after the wait: _get_ld_online_client hands out the global without locking
+    _ld_online_client = client
+    logger.info("[Backend] Provider=launchdarkly-online (server SDK)")
 
 def _init_flagsmith_online() -> None:
     global _fs_online_client
@@ -255,103 +450,284 @@ def _init_flagsmith_online() -> None:
     if FLAGSMITH_TLS_INSECURE:
         # DEMO ONLY: disables TLS verification process-wide for Python requests.
         os.environ["PYTHONHTTPSVERIFY"] = "0"
-        print("[WARN] Flagsmith-online: PYTHONHTTPSVERIFY=0 (TLS verification disabled)")
+        logger.warning("[WARN] Flagsmith-online: PYTHONHTTPSVERIFY=0 (TLS verification disabled)")
 
-    _fs_online_client = Flagsmith(
+    client = Flagsmith(
         environment_key=FLAGSMITH_ENV_KEY,
         api_url=FLAGSMITH_API_URL or None,            # NOTE: correct kwarg is api_url
         enable_local_evaluation=False,                # force online HTTP calls
         request_timeout_seconds=FLAGSMITH_REQUEST_TIMEOUT_SECONDS,
     )
-    print(f"[Backend] Provider=flagsmith-online (server SDK, timeout={FLAGSMITH_REQUEST_TIMEOUT_SECONDS}s, insecure={FLAGSMITH_TLS_INSECURE})")
+    _fs_online_client = client
+    logger.info(f"[Backend] Provider=flagsmith-online (server SDK, timeout={FLAGSMITH_REQUEST_TIMEOUT_SECONDS}s, insecure={FLAGSMITH_TLS_INSECURE})")
+
+
+def _get_ld_online_client():
+    if _ld_online_client is None:
+        with _ld_online_init_lock:
+            if _ld_online_client is None:
+                _init_launchdarkly_online()
+    return _ld_online_client
+
+def _get_fs_online_client() -> Flagsmith:
+    if _fs_online_client is None:
+        with _fs_online_init_lock:
+            if _fs_online_client is None:
+                _init_flagsmith_online()
+    return _fs_online_client
 
 # -----------------------------
 # GrowthBook evaluators (offline file)
 # -----------------------------
-def _gb_reload_if_needed() -> None:
-    global _gb_doc, _gb_mtime
-    doc, new_mtime = _load_json_with_cache(_gb_features_path, _gb_mtime)
-    if doc is not None:
-        _gb_doc = doc
+def _gb_reload(force: bool = False) -> None:
+    """Parse the features file and publish a new _GbSnapshot (one assignment)."""
+    global _gb_snap, _gb_mtime
+    with _reload_lock:
+        doc, new_mtime = _load_json_with_cache(_gb_features_path, None if force else _gb_mtime)
+        if doc is None:
+            return
+        static: Dict[str, Any] = {}
+        compiled: Dict[str, Tuple[Tuple[Tuple[Tuple[str, str], ...], Any], ...]] = {}
+        for key, feat in doc.items():
+            if not isinstance(feat, dict):
+                continue
+            if not feat.get("rules") and "defaultValue" in feat:
+                static[key] = feat["defaultValue"]
+            compiled[key] = tuple(
+                (
+                    tuple((str(k), str(v)) for k, v in (rule.get("condition") or {}).items()),
+                    rule.get("force", _MISSING),
+                )
+                for rule in feat.get("rules", [])
+            )
+        frozen = types.MappingProxyType
+        _gb_snap = _GbSnapshot(doc, frozen(static), frozen(compiled))
         _gb_mtime = new_mtime
+    _eval_cache_invalidate()
+
+def _gb_reload_if_needed() -> None:
+    # The watcher keeps the doc current; the hot path only stat()s on the coarse fallback interval
+    global _gb_checked_at
+    if _file_observer is not None and _gb_snap is not None:
+        now = time.monotonic()
+        if now - _gb_checked_at < FILE_POLL_FALLBACK_SECONDS:
+            return
+        _gb_checked_at = now
+    _gb_reload()
 
 def _gb_get_value(flag_key: str, default: Any, user_id: str) -> Any:
     _gb_reload_if_needed()
-    if not _gb_doc:
+    snap = _gb_snap
+    if snap is None:
         return default
-    feat = _gb_doc.get(flag_key)
+    if flag_key in snap.static:
+        return snap.static[flag_key]
+    feat = snap.doc.get(flag_key)
     if not feat:
         return default
-    attrs = {"userId": user_id}
-    for rule in feat.get("rules", []):
-        cond = rule.get("condition", {})
-        matched = all(str(attrs.get(k)) == str(v) for k, v in (cond or {}).items())
-        if matched:
-            return rule.get("force", feat.get("defaultValue", default))
+    # Attribute values are stringified once here; a missing attribute compares as "None"
+    attrs = {"userId": str(user_id)}
+    for conds, force in snap.compiled_rules.get(flag_key, ()):
+        for k, v in conds:
+            if attrs.get(k, "None") != v:
+                break
+        else:
+            return feat.get("defaultValue", default) if force is _MISSING else force
     return feat.get("defaultValue", default)
 
 # -----------------------------
-# Flagsmith evaluator (offline JSON with segments + feature_states)
+# File watcher (reloads GrowthBook/Flagsmith docs in the background on change)
 # -----------------------------
-def _fs_reload_if_needed() -> None:
-    global _fs_doc, _fs_mtime, _fs_feature_id_by_name, _fs_segment_by_id, _fs_states_by_fid
-    doc, new_mtime = _load_json_with_cache(_fs_env_path, _fs_mtime)
-    if doc is None:
+def _reload_debounced(name: str, reload_fn: Callable[..., None]) -> None:
+    def run() -> None:
+        try:
+            reload_fn(force=True)
+        except Exception as e:
+            logger.warning(f"[Backend] {name} reload failed: {e}")
+
+    timer = threading.Timer(FILE_RELOAD_DEBOUNCE_SECONDS, run)
+    timer.daemon = True
+    prev = _reload_timers.get(name)
+    if prev is not None:
+        prev.cancel()
+    _reload_timers[name] = timer
+    timer.start()
+
+class _FlagFileHandler(FileSystemEventHandler):
+    # Only write-side events: opened/closed_no_write fire on plain reads (including our own reload
+    # and the /static mounts), and reacting to them would re-parse the files in a loop
+    def on_modified(self, event) -> None:
+        self._reload_for(event)
+
+    def on_created(self, event) -> None:
+        self._reload_for(event)
+
+    def on_moved(self, event) -> None:
+        self._reload_for(event)
+
+    def on_closed(self, event) -> None:  # close after write
+        self._reload_for(event)
+
+    def _reload_for(self, event) -> None:
+        if event.is_directory:
+            return
+        # Editors often save via rename, so check both ends of a move
+        for raw in (event.src_path, getattr(event, "dest_path", None)):
+            if not raw:
+                continue
+            path = os.path.abspath(os.fsdecode(raw))
+            if path == str(_gb_features_path):
+                _reload_debounced("growthbook", _gb_reload)
+            elif path == str(_fs_env_path):
+                _reload_debounced("flagsmith", _fs_reload)
+
+def _start_file_watch() -> None:
+    global _file_observer, _gb_checked_at, _fs_checked_at
+    if Observer is None:
+        logger.warning("[Backend] watchdog not installed; GrowthBook/Flagsmith files are stat()ed per evaluation")
         return
-    _fs_doc = doc
-    _fs_mtime = new_mtime
-
-    _fs_feature_id_by_name.clear()
-    for f in (_fs_doc.get("features") or []):
-        _fs_feature_id_by_name[str(f["name"])] = int(f["id"])
-
-    _fs_segment_by_id.clear()
-    for s in (_fs_doc.get("segments") or []):
-        _fs_segment_by_id[int(s["id"])] = s
+    observer = Observer()
+    handler = _FlagFileHandler()
+    for d in {_gb_features_path.parent, _fs_env_path.parent}:
+        if d.is_dir():
+            observer.schedule(handler, str(d), recursive=False)
+    observer.daemon = True
+    observer.start()
+    # Load up front so the first request does not parse; missing files keep the lazy path
+    for name, reload_fn in (("growthbook", _gb_reload), ("flagsmith", _fs_reload)):
+        try:
+            reload_fn()
+        except Exception as e:
+            logger.warning(f"[Backend] {name} initial load warning: {e}")
+    _gb_checked_at = _fs_checked_at = time.monotonic()
+    _file_observer = observer
+    logger.info(
+        f"[Backend] Watching flag files (debounce {FILE_RELOAD_DEBOUNCE_SECONDS}s, "
+        f"fallback stat every {FILE_POLL_FALLBACK_SECONDS}s)"
+    )
 
-    _fs_states_by_fid.clear()
-    for st in (_fs_doc.get("feature_states") or []):
-        fid = int(st["feature_id"])
-        arr = _fs_states_by_fid.get(fid, [])
-        arr.append(st)
-        _fs_states_by_fid[fid] = arr
+# -----------------------------
+# Flagsmith evaluator (offline JSON with segments + feature_states)
+# -----------------------------
+def _fs_reload(force: bool = False) -> None:
+    """Parse the environment file and publish a new _FsSnapshot (one assignment)."""
+    global _fs_snap, _fs_mtime
+    with _reload_lock:
+        doc, new_mtime = _load_json_with_cache(_fs_env_path, None if force else _fs_mtime)
+        if doc is None:
+            return
+
+        feature_id_by_name: Dict[str, int] = {}
+        for f in (doc.get("features") or []):
+            feature_id_by_name[str(f["name"])] = int(f["id"])
+
+        segment_by_id: Dict[int, Dict[str, Any]] = {}
+        segment_matchers: Dict[int, Callable[[str], bool]] = {}
+        for s in (doc.get("segments") or []):
+            segment_by_id[int(s["id"])] = s
+            conds = _fs_compile_conds(s)
+            matcher = _fs_compile_matcher(conds) if conds is not None else None
+            if matcher is None:
+                segment_matchers.pop(int(s["id"]), None)
+            else:
+                segment_matchers[int(s["id"])] = matcher
+
+        state_by_fid_seg: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        default_state_by_fid: Dict[int, Dict[str, Any]] = {}
+        seg_ids_by_fid: Dict[int, List[int]] = {}
+        for st in (doc.get("feature_states") or []):
+            fid = int(st["feature_id"])
+            if st.get("segment_id") is None:
+                default_state_by_fid.setdefault(fid, st)
+                continue
+            seg_id = int(st["segment_id"])
+            # unknown or never-matching segments are dropped here rather than checked per call
+            if seg_id not in segment_matchers or (fid, seg_id) in state_by_fid_seg:
+                continue
+            state_by_fid_seg[(fid, seg_id)] = st
+            seg_ids_by_fid.setdefault(fid, []).append(seg_id)
+
+        static_bool: Dict[str, bool] = {}
+        static_str: Dict[str, str] = {}
+        for name, fid in feature_id_by_name.items():
+            st = default_state_by_fid.get(fid)
+            if not fid or st is None or fid in seg_ids_by_fid:
+                continue
+            if st.get("value") is not None:
+                static_bool[name] = bool(st["value"])
+                static_str[name] = str(st["value"])
+            elif "enabled" in st:
+                static_bool[name] = bool(st["enabled"])
+
+        # Read-only views: evaluators share them across threads without defensive copies
+        frozen = types.MappingProxyType
+        _fs_snap = _FsSnapshot(
+            doc=doc,
+            feature_id_by_name=frozen(feature_id_by_name),
+            segment_by_id=frozen(segment_by_id),
+            segment_matchers=frozen(segment_matchers),
+            state_by_fid_seg=frozen(state_by_fid_seg),
+            default_state_by_fid=frozen(default_state_by_fid),
+            seg_ids_by_fid=frozen({fid: tuple(ids) for fid, ids in seg_ids_by_fid.items()}),
+            static_bool=frozen(static_bool),
+            static_str=frozen(static_str),
+        )
+        _fs_mtime = new_mtime
+    _eval_cache_invalidate()
 
-def _fs_match_segment(segment: Dict[str, Any], attrs: Dict[str, Any]) -> bool:
+def _fs_reload_if_needed() -> None:
+    global _fs_checked_at
+    if _file_observer is not None and _fs_snap is not None:
+        now = time.monotonic()
+        if now - _fs_checked_at < FILE_POLL_FALLBACK_SECONDS:
+            return
+        _fs_checked_at = now
+    _fs_reload()
+
+def _fs_compile_conds(segment: Dict[str, Any]) -> Optional[Tuple[Tuple[str, str], ...]]:
+    """
+    Flatten a segment's ALL rules into (property, str(value)) pairs once at load time.
+    Only EQUAL is supported; any other operator makes the segment never match (None).
+    """
+    conds = []
     for rule in segment.get("rules") or []:
         if rule.get("type") != "ALL":
             continue
         for cond in rule.get("conditions") or []:
-            op = cond.get("operator")
-            prop = cond.get("property")
-            val = cond.get("value")
-            if op == "EQUAL":
-                if str(attrs.get(prop)) != str(val):
-                    return False
-            else:
-                return False
-    return True
+            if cond.get("operator") != "EQUAL":
+                return None
+            conds.append((cond.get("property"), str(cond.get("value"))))
+    return tuple(conds)
 
-def _fs_resolve_state(flag_key: str, attrs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    _fs_reload_if_needed()
-    if not _fs_doc:
+def _fs_compile_matcher(conds: Tuple[Tuple[str, str], ...]) -> Optional[Callable[[str], bool]]:
+    """
+    Specialize flattened conditions to a predicate on the user id (None if it can never match).
+    Evaluations only carry userId, so any other property is missing and compares as str(None).
+    """
+    wanted = set()
+    for prop, val in conds:
+        if prop == "userId":
+            wanted.add(val)
+        elif val != "None":
+            return None
+    if not wanted:
+        return lambda user_id: True
+    if len(wanted) > 1:
         return None
-    fid = _fs_feature_id_by_name.get(flag_key)
+    val, = wanted
+    return lambda user_id: user_id == val
+
+def _fs_resolve_state(snap: _FsSnapshot, flag_key: str, user_id: str) -> Optional[Dict[str, Any]]:
+    fid = snap.feature_id_by_name.get(flag_key)
     if not fid:
         return None
-    states = _fs_states_by_fid.get(fid) or []
-    if not states:
-        return None
-    matched_seg_ids = []
-    for seg_id, seg in _fs_segment_by_id.items():
-        if _fs_match_segment(seg, attrs):
-            matched_seg_ids.append(seg_id)
-    for st in states:
-        if st.get("segment_id") is not None and int(st["segment_id"]) in matched_seg_ids:
-            return st
-    for st in states:
-        if st.get("segment_id") is None:
-            return st
-    return None
+    seg_ids = snap.seg_ids_by_fid.get(fid)
+    if seg_ids:
+        user_id = str(user_id)
+        for seg_id in seg_ids:
+            if snap.segment_matchers[seg_id](user_id):
+                return snap.state_by_fid_seg[(fid, seg_id)]
+    return snap.default_state_by_fid.get(fid)
 
 def _fs_bool_from_state(state: Optional[Dict[str, Any]], default: bool) -> bool:
     if not state:
@@ -367,159 +743,384 @@ def _fs_str_from_state(state: Optional[Dict[str, Any]], default: str) -> str:
         return str(default)
     return str(state["value"])
 
+def _fs_get_bool(flag_key: str, default: bool, user_id: str) -> bool:
+    _fs_reload_if_needed()
+    snap = _fs_snap
+    if snap is None:
+        return bool(default)
+    v = snap.static_bool.get(flag_key)
+    if v is not None:
+        return v
+    return _fs_bool_from_state(_fs_resolve_state(snap, flag_key, user_id), default)
+
+def _fs_get_str(flag_key: str, default: str, user_id: str) -> str:
+    _fs_reload_if_needed()
+    snap = _fs_snap
+    if snap is None:
+        return str(default)
+    v = snap.static_str.get(flag_key)
+    if v is not None:
+        return v
+    return _fs_str_from_state(_fs_resolve_state(snap, flag_key, user_id), default)
+
 # -----------------------------
 # Flagsmith ONLINE evaluators (server SDK) — fail-fast + log
 # -----------------------------
-def _fsm_online_bool(flag_key: str, default: bool, user_id: str) -> bool:
-    if _fs_online_client is None:
-        raise RuntimeError("Flagsmith online client not initialized")
+def _fsm_online_bundle(user_id: str):
+    """
+    Fetch all identity flags in one HTTP round trip; callers read several values from it.
+    Returns None (after logging) if the request fails.
+    """
+    client = _get_fs_online_client()
     try:
-        flags = _fs_online_client.get_identity_flags(
+        return client.get_identity_flags(
             identifier=user_id or "anonymous",
             traits={"userId": user_id or "anonymous"},
         )
+    except Exception as e:
+        logger.warning(f"[Flagsmith-online] identity flags for '{user_id}' failed: {e}")
+        return None
+
+def _fsm_bundle_bool(flags, flag_key: str, default: bool) -> bool:
+    if flags is None:
+        return bool(default)
+    try:
         v = flags.is_feature_enabled(flag_key)
         return bool(v) if v is not None else bool(default)
     except Exception as e:
-        print(f"[Flagsmith-online] bool('{flag_key}') for '{user_id}' failed: {e}")
+        logger.warning(f"[Flagsmith-online] bool('{flag_key}') failed: {e}")
         return bool(default)
 
-def _fsm_online_str(flag_key: str, default: str, user_id: str) -> str:
-    if _fs_online_client is None:
-        raise RuntimeError("Flagsmith online client not initialized")
+def _fsm_bundle_str(flags, flag_key: str, default: str) -> str:
+    if flags is None:
+        return str(default)
     try:
-        flags = _fs_online_client.get_identity_flags(
-            identifier=user_id or "anonymous",
-            traits={"userId": user_id or "anonymous"},
-        )
         v = flags.get_feature_value(flag_key)
         return str(v) if v is not None else str(default)
     except Exception as e:
-        print(f"[Flagsmith-online] str('{flag_key}') for '{user_id}' failed: {e}")
+        logger.warning(f"[Flagsmith-online] str('{flag_key}') failed: {e}")
         return str(default)
 
+def _fsm_online_bool(flag_key: str, default: bool, user_id: str) -> bool:
+    return _fsm_bundle_bool(_fsm_online_bundle(user_id), flag_key, default)
+
+def _fsm_online_str(flag_key: str, default: str, user_id: str) -> str:
+    return _fsm_bundle_str(_fsm_online_bundle(user_id), flag_key, default)
+
 # -----------------------------
 # Unified evaluators
 # -----------------------------
-def _effective_provider(req_provider: Optional[str]) -> str:
-    p = (req_provider or BACKEND_PROVIDER or "flagd").lower().strip()
-    if p not in {
-        "flagd",
-        "launchdarkly",
-        "launchdarkly-online",
-        "growthbook",
-        "flagsmith",
-        "flagsmith-online",
-    }:
-        p = BACKEND_PROVIDER
-    return p
+_VALID_PROVIDERS = frozenset({
+    "flagd",
+    "launchdarkly",
+    "launchdarkly-online",
+    "growthbook",
+    "flagsmith",
+    "flagsmith-online",
+})
+
+# Providers whose per-evaluation call blocks on the network (gRPC / HTTP)
+_REMOTE_EVAL_PROVIDERS = frozenset({"flagd", "flagsmith-online"})
+
+@functools.lru_cache(maxsize=32)
+def _normalize_provider(req_provider: str, default_provider: str) -> str:
+    p = req_provider.lower().strip()
+    return p if p in _VALID_PROVIDERS else default_provider
 
-def ff_bool(flag_key: str, default: bool, user_id: str, provider: Optional[str] = None) -> bool:
-    p = _effective_provider(provider)
-    if p == "launchdarkly":
-        if _ld_client is None:
-            raise RuntimeError("LaunchDarkly (file mode) client not initialized")
-        ctx = build_ld_context(user_id)
-        return bool(_ld_client.variation(flag_key, ctx, default))
-    if p == "launchdarkly-online":
-        if _ld_online_client is None:
-            raise RuntimeError("LaunchDarkly online client not initialized")
-        ctx = build_ld_context(user_id)
-        return bool(_ld_online_client.variation(flag_key, ctx, default))
+def _effective_provider(req_provider: Optional[str]) -> str:
+    # Routes pass None unless ?provider= is given; the default is normalized once at startup
+    if not req_provider:
+        return _DEFAULT_PROVIDER
+    return _normalize_provider(req_provider, _DEFAULT_PROVIDER)
+
+# Per-provider evaluators: (flag_key, default, user_id, ctx) -> value.
+# ctx is an optional pre-built SDK context (see _build_ctx_for); None means build it from user_id.
+# Each reads its client global at call time and fails fast if it is not initialized.
+def _ld_file_client():
+    if _ld_client is None:
+        raise RuntimeError("LaunchDarkly (file mode) client not initialized")
+    return _ld_client
+
+def _ld_online():
+    return _get_ld_online_client()
+
+def _of():
+    if _of_client is None:
+        raise RuntimeError("OpenFeature (flagd) client not initialized")
+    return _of_client
+
+def _build_ctx_for(p: str, user_id: str):
+    """Build the SDK context provider p evaluates against (None for file/HTTP providers)."""
+    if p in ("launchdarkly", "launchdarkly-online"):
+        return build_ld_context(user_id)
     if p == "flagd":
-        if _of_client is None:
-            raise RuntimeError("OpenFeature (flagd) client not initialized")
-        ctx = build_of_context(user_id)
-        return bool(_of_client.get_boolean_value(flag_key, default, ctx))
-    if p == "growthbook":
-        return bool(_gb_get_value(flag_key, default, user_id))
-    if p == "flagsmith":
-        state = _fs_resolve_state(flag_key, {"userId": user_id})
-        return _fs_bool_from_state(state, default)
-    if p == "flagsmith-online":
-        return _fsm_online_bool(flag_key, default, user_id)
+        return build_of_context(user_id)
+    return None
+
+def _eval_ld_bool(flag_key: str, default: bool, user_id: str, ctx=None) -> bool:
+    ctx = build_ld_context(user_id) if ctx is None else ctx
+    return bool(_ld_file_client().variation(flag_key, ctx, default))
+
+def _eval_ld_str(flag_key: str, default: str, user_id: str, ctx=None) -> str:
+    ctx = build_ld_context(user_id) if ctx is None else ctx
+    return str(_ld_file_client().variation(flag_key, ctx, default))
+
+def _eval_ld_online_bool(flag_key: str, default: bool, user_id: str, ctx=None) -> bool:
+    ctx = build_ld_context(user_id) if ctx is None else ctx
+    return bool(_ld_online().variation(flag_key, ctx, default))
+
+def _eval_ld_online_str(flag_key: str, default: str, user_id: str, ctx=None) -> str:
+    ctx = build_ld_context(user_id) if ctx is None else ctx
+    return str(_ld_online().variation(flag_key, ctx, default))
+
+def _eval_flagd_bool(flag_key: str, default: bool, user_id: str, ctx=None) -> bool:
+    ctx = build_of_context(user_id) if ctx is None else ctx
+    return bool(_of().get_boolean_value(flag_key, default, ctx))
+
+def _eval_flagd_str(flag_key: str, default: str, user_id: str, ctx=None) -> str:
+    ctx = build_of_context(user_id) if ctx is None else ctx
+    return str(_of().get_string_value(flag_key, default, ctx))
+
+def _eval_gb_bool(flag_key: str, default: bool, user_id: str, ctx=None) -> bool:
+    return bool(_gb_get_value(flag_key, default, user_id))
+
+def _eval_gb_str(flag_key: str, default: str, user_id: str, ctx=None) -> str:
+    return str(_gb_get_value(flag_key, default, user_id))
+
+def _eval_fs_bool(flag_key: str, default: bool, user_id: str, ctx=None) -> bool:
+    return _fs_get_bool(flag_key, default, user_id)
+
+def _eval_fs_str(flag_key: str, default: str, user_id: str, ctx=None) -> str:
+    return _fs_get_str(flag_key, default, user_id)
+
+def _eval_fsm_online_bool(flag_key: str, default: bool, user_id: str, ctx=None) -> bool:
+    return _fsm_online_bool(flag_key, default, user_id)
+
+def _eval_fsm_online_str(flag_key: str, default: str, user_id: str, ctx=None) -> str:
+    return _fsm_online_str(flag_key, default, user_id)
+
+def _eval_default_bool(flag_key: str, default: bool, user_id: str, ctx=None) -> bool:
     return bool(default)
 
+def _eval_default_str(flag_key: str, default: str, user_id: str, ctx=None) -> str:
+    return str(default)
+
+_BOOL_DISPATCH: Dict[str, Callable[..., bool]] = {
+    "flagd": _eval_flagd_bool,
+    "launchdarkly": _eval_ld_bool,
+    "launchdarkly-online": _eval_ld_online_bool,
+    "growthbook": _eval_gb_bool,
+    "flagsmith": _eval_fs_bool,
+    "flagsmith-online": _eval_fsm_online_bool,
+}
+
+_STR_DISPATCH: Dict[str, Callable[..., str]] = {
+    "flagd": _eval_flagd_str,
+    "launchdarkly": _eval_ld_str,
+    "launchdarkly-online": _eval_ld_online_str,
+    "growthbook": _eval_gb_str,
+    "flagsmith": _eval_fs_str,
+    "flagsmith-online": _eval_fsm_online_str,
+}
+
+def ff_bool_ctx(flag_key: str, default: bool, user_id: str, ctx, provider: Optional[str] = None) -> bool:
+    """Like ff_bool, but reuses a context from _build_ctx_for (one build for several flags)."""
+    p = _effective_provider(provider)
+    fn = _BOOL_DISPATCH.get(p, _eval_default_bool)
+    return _cached_eval(p, "b", flag_key, default, user_id, lambda: fn(flag_key, default, user_id, ctx))
+
+def ff_str_ctx(flag_key: str, default: str, user_id: str, ctx, provider: Optional[str] = None) -> str:
+    p = _effective_provider(provider)
+    fn = _STR_DISPATCH.get(p, _eval_default_str)
+    return _cached_eval(p, "s", flag_key, default, user_id, lambda: fn(flag_key, default, user_id, ctx))
+
+def ff_bool(flag_key: str, default: bool, user_id: str, provider: Optional[str] = None) -> bool:
+    return ff_bool_ctx(flag_key, default, user_id, None, provider)
+
 def ff_str(flag_key: str, default: str, user_id: str, provider: Optional[str] = None) -> str:
+    return ff_str_ctx(flag_key, default, user_id, None, provider)
+
+# -----------------------------
+# Batch evaluation (one provider round trip for several flags where the SDK allows it)
+# -----------------------------
+def _batch_reader(p: str, user_id: str) -> Callable[[str, Any, str], Any]:
+    """
+    Return a reader mapping (flag_key, default, kind) -> value for provider p.
+    Only flagsmith-online is fetched in bulk (one HTTP round trip); the rest evaluate per key.
+    """
+    if p == "flagsmith-online":
+        flags = _fsm_online_bundle(user_id)
+
+        def read_fsm(flag_key: str, default: Any, kind: str) -> Any:
+            if kind == "b":
+                return _fsm_bundle_bool(flags, flag_key, default)
+            return _fsm_bundle_str(flags, flag_key, default)
+        return read_fsm
+
+    # LD variation() is already in-memory, and unlike all_flags_state() it records analytics
+    # events; flagd has no "all flags" call. Evaluate per key with a shared context.
+    ctx = _build_ctx_for(p, user_id)
+    bool_fn = _BOOL_DISPATCH.get(p, _eval_default_bool)
+    str_fn = _STR_DISPATCH.get(p, _eval_default_str)
+
+    def read_each(flag_key: str, default: Any, kind: str) -> Any:
+        return (bool_fn if kind == "b" else str_fn)(flag_key, default, user_id, ctx)
+    return read_each
+
+def ff_batch(keys: List[Tuple[str, Any, str]], user_id: str, provider: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Evaluate several (flag_key, default, kind) triples for one user; kind is "b" or "s".
+    Cached values are served first; the provider is only called (once) if something missed.
+    """
+    p = _effective_provider(provider)
+    reader: Optional[Callable[[str, Any, str], Any]] = None  # built on the first cache miss
+
+    def read(flag_key: str, default: Any, kind: str) -> Any:
+        nonlocal reader
+        if reader is None:
+            reader = _batch_reader(p, user_id)
+        return reader(flag_key, default, kind)
+
+    out: Dict[str, Any] = {}
+    for flag_key, default, kind in keys:
+        out[flag_key] = _cached_eval(p, kind, flag_key, default, user_id,
+                                     lambda k=flag_key, d=default, kd=kind: read(k, d, kd))
+    return out
+
+# -----------------------------
+# Async wrappers for route handlers
+# -----------------------------
+# The provider SDKs are synchronous (OpenFeature's *_async methods on FlagdProvider just call
+# the sync resolver), so network-bound evaluations run via asyncio.to_thread; in-memory
+# providers and cache hits stay on the event loop.
+def _blocks_event_loop(p: str) -> bool:
+    # LD online evaluates in memory, but its lazy first-use init waits on the network
+    return p in _REMOTE_EVAL_PROVIDERS or (p == "launchdarkly-online" and _ld_online_client is None)
+
+async def _ff_async(kind: str, flag_key: str, default: Any, user_id: str, provider: Optional[str], ctx=None) -> Any:
+    p = _effective_provider(provider)
+    sync_fn = ff_bool_ctx if kind == "b" else ff_str_ctx
+    if not _blocks_event_loop(p):
+        return sync_fn(flag_key, default, user_id, ctx, p)
+    hit = _eval_cache_peek(p, kind, flag_key, default, user_id)
+    if hit is not _MISSING:
+        return hit
+    return await asyncio.to_thread(sync_fn, flag_key, default, user_id, ctx, p)
+
+async def ff_bool_async(flag_key: str, default: bool, user_id: str, provider: Optional[str] = None) -> bool:
+    return await _ff_async("b", flag_key, default, user_id, provider)
+
+async def ff_str_async(flag_key: str, default: str, user_id: str, provider: Optional[str] = None) -> str:
+    return await _ff_async("s", flag_key, default, user_id, provider)
+
+async def ff_batch_async(keys: List[Tuple[str, Any, str]], user_id: str, provider: Optional[str] = None) -> Dict[str, Any]:
     p = _effective_provider(provider)
-    if p == "launchdarkly":
-        if _ld_client is None:
-            raise RuntimeError("LaunchDarkly (file mode) client not initialized")
-        ctx = build_ld_context(user_id)
-        v = _ld_client.variation(flag_key, ctx, default)
-        return str(v)
-    if p == "launchdarkly-online":
-        if _ld_online_client is None:
-            raise RuntimeError("LaunchDarkly online client not initialized")
-        ctx = build_ld_context(user_id)
-        v = _ld_online_client.variation(flag_key, ctx, default)
-        return str(v)
     if p == "flagd":
-        if _of_client is None:
-            raise RuntimeError("OpenFeature (flagd) client not initialized")
-        ctx = build_of_context(user_id)
-        return str(_of_client.get_string_value(flag_key, default, ctx))
-    if p == "growthbook":
-        v = _gb_get_value(flag_key, default, user_id)
-        return str(v)
-    if p == "flagsmith":
-        state = _fs_resolve_state(flag_key, {"userId": user_id})
-        return _fs_str_from_state(state, default)
-    if p == "flagsmith-online":
-        return _fsm_online_str(flag_key, default, user_id)
-    return str(default)
+        # No bulk API: run the per-flag gRPC calls concurrently against one shared context
+        ctx = _build_ctx_for(p, user_id)
+        results = await asyncio.gather(*(_ff_async(kind, k, d, user_id, p, ctx) for k, d, kind in keys))
+        return {k: v for (k, _, _), v in zip(keys, results)}
+    if _blocks_event_loop(p):
+        return await asyncio.to_thread(ff_batch, keys, user_id, p)
+    return ff_batch(keys, user_id, p)
+
+# -----------------------------
+# Lifespan (startup / shutdown)
+# -----------------------------
+async def startup_init() -> None:
+    global BACKEND_PROVIDER, _DEFAULT_PROVIDER
+    BACKEND_PROVIDER = os.getenv("BACKEND_PROVIDER", BACKEND_PROVIDER).lower().strip()
+    _DEFAULT_PROVIDER = sys.intern(BACKEND_PROVIDER or "flagd")
+    _healthz_bodies.clear()
+
+    # Each init blocks on its own handshake and assigns a distinct global, so run them concurrently off the loop
+    inits = {
+        "flagd": _init_flagd_openfeature,
+        "launchdarkly (file)": _init_launchdarkly_file_mode,
+    }
+    tasks = {asyncio.create_task(asyncio.to_thread(fn)): name for name, fn in inits.items()}
+    # Bounded by the inits that actually run here; online clients are created on first use
+    flagd_deadline = (FLAGD_DEADLINE_MS or _FLAGD_DEFAULT_DEADLINE_MS) / 1000.0
+    done, pending = await asyncio.wait(tasks, timeout=max(LD_FILE_INIT_TIMEOUT_SECONDS, flagd_deadline) + 1)
+    for task in done:
+        if task.exception() is not None:
+            logger.warning(f"[Backend] {tasks[task]} init warning: {task.exception()}")
+    for task in pending:
+        # the worker thread cannot be interrupted; it finishes in the background
+        logger.warning(f"[Backend] {tasks[task]} init still running after startup timeout")
+
+    _init_httpx()
+    try:
+        _start_file_watch()
+    except Exception as e:
+        logger.warning(f"[Backend] file watch init warning: {e}")
+
+def _init_httpx() -> None:
+    """
+    Pooled client for the raw Flagsmith diag route so TLS handshakes are paid once.
+    The Flagsmith SDK client (_fs_online_client) keeps its own pooled requests.Session.
+    """
+    global _httpx
+    _httpx = httpx.AsyncClient(
+        http2=True,
+        timeout=FLAGSMITH_REQUEST_TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_keepalive_connections=50),
+        headers={"Accept-Encoding": "gzip"},  # keep-alive is implicit (HTTP/1.1 default, HTTP/2 multiplexed)
+        verify=not FLAGSMITH_TLS_INSECURE,
+    )
+
+async def shutdown_close() -> None:
+    if _httpx is not None:
+        await _httpx.aclose()
+    if _file_observer is not None:
+        _file_observer.stop()
+    for timer in list(_reload_timers.values()):
+        timer.cancel()
+
+@contextlib.asynccontextmanager
+async def lifespan(_app: FastAPI):
+    await startup_init()
+    try:
+        yield
+    finally:
+        await shutdown_close()
 
 # -----------------------------
 # FastAPI app
 # -----------------------------
-app = FastAPI()
+class _FastJSONResponse(Response):
+    """JSONResponse rendered through _json_dumps (orjson when installed, UTF-8 output either way)."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _json_dumps(content)
+
+app = FastAPI(default_response_class=_FastJSONResponse, lifespan=lifespan)
 
 app.mount("/static/growthbook", StaticFiles(directory=BASE_DIR / "growthbook"), name="growthbook-static")
 app.mount("/static/flagsmith", StaticFiles(directory=BASE_DIR / "flagsmith"), name="flagsmith-static")
 
+# Only the frontend calls the API, with plain GETs; CORS is the sole middleware (uvicorn logs access)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # permissive for dev
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=[FRONTEND_ORIGIN],
+    allow_methods=["GET"],
+    allow_headers=["content-type"],
 )
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    print(f"[HTTP] {request.method} {request.url}")
-    try:
-        response = await call_next(request)
-        return response
-    finally:
-        pass
-
-@app.on_event("startup")
-def startup_init() -> None:
-    global BACKEND_PROVIDER
-    BACKEND_PROVIDER = os.getenv("BACKEND_PROVIDER", BACKEND_PROVIDER).lower().strip()
-    try:
-        _init_flagd_openfeature()
-    except Exception as e:
-        print(f"[Backend] flagd init warning: {e}")
-    try:
-        _init_launchdarkly_file_mode()
-    except Exception as e:
-        print(f"[Backend] launchdarkly (file) init warning: {e}")
-    try:
-        _init_launchdarkly_online()
-    except Exception as e:
-        print(f"[Backend] launchdarkly-online init warning: {e}")
-    try:
-        _init_flagsmith_online()
-    except Exception as e:
-        print(f"[Backend] flagsmith-online init warning: {e}")
-
 # -----------------------------
 # Routes (provider-aware)
 # -----------------------------
-@app.get("/api/healthz")
-def healthz(provider: Optional[str] = None) -> dict:
-    p = _effective_provider(provider)
+# Fixed response bodies, serialized once instead of per request
+_HELLO_ON = _json_dumps({"message": "New feature is ON 🎉 (from backend)"})
+_HELLO_OFF = _json_dumps({"message": "New feature is OFF (from backend)"})
+_SECRET = _json_dumps({"secret": "🍪 super secret data"})
+# (provider, TLS env values) -> healthz body. The TLS vars are read per request because
+# _init_flagsmith_online may set PYTHONHTTPSVERIFY lazily; the LD file mtime is never cached.
+_HEALTHZ_TLS_VARS = ("SSL_CERT_FILE", "REQUESTS_CA_BUNDLE", "PYTHONHTTPSVERIFY")
+_healthz_bodies: Dict[Tuple[str, Tuple[Optional[str], ...]], bytes] = {}
+
+def _healthz_payload(p: str, tls: Tuple[Optional[str], ...]) -> dict:
     return {
         "status": "ok",
         "backendProviderDefault": BACKEND_PROVIDER,
@@ -530,61 +1131,89 @@ def healthz(provider: Optional[str] = None) -> dict:
         "growthbookFile": str(_gb_features_path) if p == "growthbook" else None,
         "flagsmithFile": str(_fs_env_path) if p == "flagsmith" else None,
         "flagsmithOnline": (p == "flagsmith-online"),
-        "tls": {
-            "SSL_CERT_FILE": os.environ.get("SSL_CERT_FILE"),
-            "REQUESTS_CA_BUNDLE": os.environ.get("REQUESTS_CA_BUNDLE"),
-            "PYTHONHTTPSVERIFY": os.environ.get("PYTHONHTTPSVERIFY"),
-        },
+        "tls": dict(zip(_HEALTHZ_TLS_VARS, tls)),
         "ldFile": {
             "path": str(_ld_flags_path) if p == "launchdarkly" else None,
             "mtime": (_ld_flags_path.stat().st_mtime if _ld_flags_path.exists() and p == "launchdarkly" else None),
         }
     }
 
+@app.get("/api/healthz")
+async def healthz(provider: Optional[str] = None) -> Response:
+    p = _effective_provider(provider)
+    tls = tuple(os.environ.get(k) for k in _HEALTHZ_TLS_VARS)
+    key = (p, tls)
+    body = _healthz_bodies.get(key)
+    if body is None:
+        body = _json_dumps(_healthz_payload(p, tls))
+        if p != "launchdarkly":
+            _healthz_bodies[key] = body
+    return Response(content=body, media_type="application/json")
+
+_FLAGS_KEYS: List[Tuple[str, Any, str]] = [
+    ("new-badge", False, "b"),
+    ("cta-color", "blue", "s"),
+    ("api-new-endpoint-enabled", False, "b"),
+]
+
+async def _flags_payload(p: str, userId: str) -> dict:
+    values = await ff_batch_async(_FLAGS_KEYS, userId, p)
+    return {
+        "newBadge": values["new-badge"],
+        "ctaColor": values["cta-color"],
+        "apiNewEndpointEnabled": values["api-new-endpoint-enabled"],
+        "provider": p,
+    }
+
 @app.get("/api/flags")
-def get_flags(userId: str = "anonymous", provider: Optional[str] = None) -> dict:
+async def get_flags(userId: str = "anonymous", provider: Optional[str] = None) -> Response:
+    p = _effective_provider(provider)
+    # Generation captured before evaluating, as in _cached_eval: a body built from a doc that
+    # reloads mid-request is stored under the old generation and never served
+    key = (_eval_cache_gen, p, userId)
+    if EVAL_CACHE_ENABLED:
+        with _eval_cache_lock:
+            body = _flags_resp_cache.get(key)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
     try:
-        new_badge = ff_bool("new-badge", False, userId, provider)
-        cta_color = ff_str("cta-color", "blue", userId, provider)
-        api_enabled = ff_bool("api-new-endpoint-enabled", False, userId, provider)
-        return {
-            "newBadge": new_badge,
-            "ctaColor": cta_color,
-            "apiNewEndpointEnabled": api_enabled,
-            "provider": _effective_provider(provider),
-        }
+        payload = await _flags_payload(p, userId)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Flag evaluation failed: {e}")
+    body = _json_dumps(payload)
+    if EVAL_CACHE_ENABLED:
+        with _eval_cache_lock:
+            _flags_resp_cache[key] = body
+    return Response(content=body, media_type="application/json")
 
 @app.get("/api/hello")
-def hello(userId: str = "anonymous", provider: Optional[str] = None) -> dict:
-    on = ff_bool("new-badge", False, userId, provider)
-    return {"message": "New feature is ON 🎉 (from backend)"} if on else {"message": "New feature is OFF (from backend)"}
+async def hello(userId: str = "anonymous", provider: Optional[str] = None) -> Response:
+    on = await ff_bool_async("new-badge", False, userId, provider)
+    return Response(content=_HELLO_ON if on else _HELLO_OFF, media_type="application/json")
 
 @app.get("/api/secret")
-def secret(userId: str = "anonymous", provider: Optional[str] = None) -> dict:
-    allowed = ff_bool("api-new-endpoint-enabled", False, userId, provider)
+async def secret(userId: str = "anonymous", provider: Optional[str] = None) -> Response:
+    allowed = await ff_bool_async("api-new-endpoint-enabled", False, userId, provider)
     if not allowed:
         raise HTTPException(status_code=403, detail="Feature disabled by flag")
-    return {"secret": "🍪 super secret data"}
+    return Response(content=_SECRET, media_type="application/json")
 
 # --- Diagnostics ---
 
 # Flagsmith ONLINE diag (kept)
-import requests
-
 @app.get("/api/diag/flagsmith-online")
 def diag_flagsmith_online(userId: str = "anonymous") -> dict:
     try:
-        b = _fsm_online_bool("new-badge", False, userId)
-        s = _fsm_online_str("cta-color", "blue", userId)
-        a = _fsm_online_bool("api-new-endpoint-enabled", False, userId)
+        flags = _fsm_online_bundle(userId)
+        b = _fsm_bundle_bool(flags, "new-badge", False)
+        s = _fsm_bundle_str(flags, "cta-color", "blue")
+        a = _fsm_bundle_bool(flags, "api-new-endpoint-enabled", False)
         return {"ok": True, "newBadge": b, "ctaColor": s, "apiNewEndpointEnabled": a}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
 @app.get("/api/diag/flagsmith-online-raw")
-def diag_flagsmith_online_raw(userId: str = "anonymous") -> dict:
+async def diag_flagsmith_online_raw(userId: str = "anonymous") -> dict:
     base = (FLAGSMITH_API_URL or "https://edge.api.flagsmith.com/api/v1/").rstrip("/")
     url = f"{base}/identities/"
     headers = {
@@ -596,15 +1225,17 @@ def diag_flagsmith_online_raw(userId: str = "anonymous") -> dict:
         "traits": [{"trait_key": "userId", "trait_value": userId or "anonymous"}],
     }
     try:
-        resp = requests.post(url, headers=headers, json=body, timeout=FLAGSMITH_REQUEST_TIMEOUT_SECONDS)
+        if _httpx is None:
+            raise RuntimeError("HTTP client not initialized")
+        resp = await _httpx.post(url, headers=headers, content=_json_dumps(body))
         try:
-            parsed = resp.json()
+            parsed = _json_loads(resp.content)
         except Exception:
             parsed = resp.text[:2000]
         return {
             "url": url,
             "status": resp.status_code,
-            "ok": resp.ok,
+            "ok": resp.is_success,
             "headers": dict(resp.headers),
             "body": parsed,
             "sent_headers": {"X-Environment-Key_present": bool(headers["X-Environment-Key"])},
@@ -620,12 +1251,11 @@ def diag_flagsmith_online_raw(userId: str = "anonymous") -> dict:
 @app.get("/api/diag/launchdarkly-online")
 def diag_launchdarkly_online(userId: str = "anonymous") -> dict:
     try:
-        if _ld_online_client is None:
-            return {"ok": False, "error": "launchdarkly online client not initialized"}
+        client = _get_ld_online_client()
         ctx = build_ld_context(userId)
-        b = bool(_ld_online_client.variation("new-badge", ctx, False))
-        s = str(_ld_online_client.variation("cta-color", ctx, "blue"))
-        a = bool(_ld_online_client.variation("api-new-endpoint-enabled", ctx, False))
+        b = bool(client.variation("new-badge", ctx, False))
+        s = str(client.variation("cta-color", ctx, "blue"))
+        a = bool(client.variation("api-new-endpoint-enabled", ctx, False))
         return {
             "ok": True,
             "sample": {"newBadge": b, "ctaColor": s, "apiNewEndpointEnabled": a},
@@ -652,17 +1282,22 @@ def diag_launchdarkly_file(userId: str = "anonymous") -> dict:
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
-# LaunchDarkly FILE diag – mtime + sha256 to confirm actual on-disk changes
+# LaunchDarkly FILE diag – mtime + content hash to confirm actual on-disk changes
 @app.get("/api/diag/launchdarkly-file-hash")
 def diag_launchdarkly_file_hash() -> dict:
     try:
-        exists = _ld_flags_path.exists()
+        try:
+            st = _ld_flags_path.stat()
+        except FileNotFoundError:
+            st = None
         return {
             "ok": True,
             "path": str(_ld_flags_path),
-            "exists": exists,
-            "mtime": (_ld_flags_path.stat().st_mtime if exists else None),
-            "sha256": (_sha256_file(_ld_flags_path) if exists else None),
+            "exists": st is not None,
+            "mtime": (st.st_mtime if st else None),
+            "contentHash": (_content_hash_file_cached(_ld_flags_path, st) if st else None),
+            "hashAlgo": FILE_HASH_ALGO,
+            "cache": dict(_hash_cache_stats),
         }
     except Exception as e:
         return {"ok": False, "error": str(e)}
\ No newline at end of file